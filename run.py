@@ -15,5 +15,11 @@ if __name__ == "__main__":
     port = int(os.environ.get('PORT', 8000))
     host = os.environ.get('HOST', '0.0.0.0')
 
-    print(f"Starting server on {host}:{port}")
-    uvicorn.run("server:app", host=host, port=port, reload=True)
+    # Auto-reload only in development; otherwise run one worker per core (2n+1)
+    if os.environ.get('ENV') == 'dev':
+        print(f"Starting development server on {host}:{port}")
+        uvicorn.run("server:app", host=host, port=port, reload=True)
+    else:
+        workers = int(os.environ.get('WEB_CONCURRENCY', (os.cpu_count() or 1) * 2 + 1))
+        print(f"Starting server on {host}:{port} with {workers} workers")
+        uvicorn.run("server:app", host=host, port=port, workers=workers)
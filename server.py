@@ -1,16 +1,20 @@
-from fastapi import FastAPI, APIRouter, HTTPException, UploadFile, File, Form
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, APIRouter, HTTPException, UploadFile, File, Form, Request, Response
+from fastapi.responses import StreamingResponse, ORJSONResponse
+from fastapi.staticfiles import StaticFiles
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import AsyncMongoClient, ASCENDING, IndexModel, ReturnDocument, UpdateOne
 import os
+import orjson
+import asyncio
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional
+from typing import List, Optional, Union
 import uuid
+import time
+import hashlib
 from datetime import datetime, timezone
-import aiofiles
 import shutil
 
 ROOT_DIR = Path(__file__).parent
@@ -18,42 +22,74 @@ load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncMongoClient(
+    mongo_url,
+    minPoolSize=int(os.environ.get('MONGO_MIN_POOL', 5)),
+    maxPoolSize=int(os.environ.get('MONGO_MAX_POOL', 50)),
+    serverSelectionTimeoutMS=5000,
+    maxIdleTimeMS=30000,
+    tz_aware=True,
+)
 db = client[os.environ['DB_NAME']]
 
 # Create uploads directory
 UPLOADS_DIR = ROOT_DIR / 'uploads'
 UPLOADS_DIR.mkdir(exist_ok=True)
+UPLOAD_CHUNK_SIZE = 1 << 20  # 1 MiB
 
 # Create the main app without a prefix
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
 
 # Define Models
+class Coordinates(BaseModel):
+    x: float
+    y: float
+    z: float
+
+def utc_now() -> datetime:
+    # BSON dates hold milliseconds; truncate so the value returned on create matches what is stored
+    now = datetime.now(timezone.utc)
+    return now.replace(microsecond=now.microsecond // 1000 * 1000)
+
 class Location(BaseModel):
     model_config = ConfigDict(extra="ignore")
     
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     name: str
     description: Optional[str] = None
-    coordinates: dict  # {x: float, y: float, z: float}
+    # Writes require x/y/z; documents stored before that may hold any dict and are returned as-is
+    coordinates: Union[Coordinates, dict] = Field(union_mode="left_to_right")
     icon_url: Optional[str] = None
-    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    created_at: datetime = Field(default_factory=utc_now)
+
+def location_projection(fields) -> dict:
+    # Select only model fields (and coordinate axes) so stray stored keys never reach raw responses
+    projection = {"_id": 0}
+    for field in fields:
+        if field == "coordinates":
+            projection.update({f"coordinates.{axis}": 1 for axis in Coordinates.model_fields})
+        else:
+            projection[field] = 1
+    return projection
 
 class LocationCreate(BaseModel):
     name: str
     description: Optional[str] = None
-    coordinates: dict
+    coordinates: Coordinates
     icon_url: Optional[str] = None
 
 class LocationUpdate(BaseModel):
     name: Optional[str] = None
     description: Optional[str] = None
-    coordinates: Optional[dict] = None
+    coordinates: Optional[Coordinates] = None
     icon_url: Optional[str] = None
 
+class LocationBulkDelete(BaseModel):
+    ids: List[str]
+
 class AdminPinVerify(BaseModel):
     pin: str
 
@@ -61,9 +97,53 @@ class AdminSettings(BaseModel):
     model_config = ConfigDict(extra="ignore")
     pin: str = "1234"  # Default PIN
 
+# In-process cache of the admin PIN (changes rarely; call invalidate_admin_pin_cache() after updating it).
+# The TTL bounds how long a PIN changed directly in Mongo keeps working on each worker.
+ADMIN_PIN_CACHE_TTL = 300  # seconds
+_admin_pin_cache: Optional[tuple] = None  # (expires_at, pin)
+
+async def get_admin_pin() -> Optional[str]:
+    global _admin_pin_cache
+    if _admin_pin_cache is None or _admin_pin_cache[0] <= time.monotonic():
+        settings = await db.admin_settings.find_one({"_id": "admin"})
+        if not settings:
+            _admin_pin_cache = None
+            return None
+        _admin_pin_cache = (time.monotonic() + ADMIN_PIN_CACHE_TTL, settings.get("pin"))
+    return _admin_pin_cache[1]
+
+def invalidate_admin_pin_cache():
+    global _admin_pin_cache
+    _admin_pin_cache = None
+
+# In-process cache of the GET /api/locations result (invalidated on every location write).
+# Each worker checks a version counter kept in Mongo before serving it, so a write handled
+# by one worker invalidates the cache in all of them. The trade-off is one _id lookup on
+# cache_versions per request (including 304s); hits still skip the list query and encoding.
+LOCATIONS_CACHE_TTL = 60  # seconds
+_locations_cache: Optional[tuple] = None  # (version, expires_at, body, etag)
+# Bumped on every invalidation so a read that raced a write doesn't store its stale snapshot
+_locations_cache_generation = 0
+
+async def get_locations_version() -> int:
+    doc = await db.cache_versions.find_one({"_id": "locations"})
+    return doc["version"] if doc else 0
+
+async def invalidate_locations_cache():
+    global _locations_cache, _locations_cache_generation
+    _locations_cache = None
+    _locations_cache_generation += 1
+    # The location write has already succeeded, so a failed bump is logged rather than raised;
+    # other workers then catch up when their cache TTL expires
+    try:
+        await db.cache_versions.update_one({"_id": "locations"}, {"$inc": {"version": 1}}, upsert=True)
+    except Exception as e:
+        logger.error(f"Error bumping locations cache version: {e}")
+
 # Initialize admin settings
 @app.on_event("startup")
 async def initialize_admin():
+    global _admin_pin_cache
     logger.info("Initializing admin settings...")
     try:
         existing = await db.admin_settings.find_one({"_id": "admin"})
@@ -73,12 +153,62 @@ async def initialize_admin():
                 "_id": "admin",
                 "pin": "1234"
             })
+            _admin_pin_cache = (time.monotonic() + ADMIN_PIN_CACHE_TTL, "1234")
             logger.info("Admin settings initialized with PIN 1234")
         else:
+            _admin_pin_cache = (time.monotonic() + ADMIN_PIN_CACHE_TTL, existing.get("pin"))
             logger.info("Admin settings already exist")
     except Exception as e:
         logger.error(f"Error initializing admin settings: {e}")
 
+# Ensure indexes for location lookups (admin_settings is keyed on _id, which is always indexed)
+async def ensure_indexes():
+    try:
+        await db.locations.create_indexes([
+            IndexModel([("id", ASCENDING)], unique=True),
+            IndexModel([("name", ASCENDING)]),
+        ])
+        logger.info("Location indexes ensured")
+    except Exception as e:
+        logger.error(f"Error creating location indexes: {e}")
+
+# Migrate documents written before created_at was a BSON date and coordinates were floats,
+# so the raw list endpoint returns them exactly as the model-backed endpoints do.
+# Idempotent (only matching documents are touched), so every worker can run it at startup.
+async def migrate_legacy_locations():
+    try:
+        legacy = {"$or": [
+            {"created_at": {"$type": "string"}},
+            *({f"coordinates.{axis}": {"$type": ["int", "long"]}} for axis in Coordinates.model_fields),
+        ]}
+        updates = []
+        async for doc in db.locations.find(legacy, {"_id": 1, "id": 1, "created_at": 1, "coordinates": 1}):
+            fields = {}
+            if isinstance(doc.get("created_at"), str):
+                try:
+                    fields["created_at"] = datetime.fromisoformat(doc["created_at"])
+                except ValueError:
+                    logger.warning(f"Skipping unparsable created_at on location {doc.get('id')}: {doc['created_at']}")
+            coordinates = doc.get("coordinates")
+            if isinstance(coordinates, dict):
+                for axis in Coordinates.model_fields:
+                    value = coordinates.get(axis)
+                    if isinstance(value, int) and not isinstance(value, bool):
+                        fields[f"coordinates.{axis}"] = float(value)
+            if fields:
+                updates.append(UpdateOne({"_id": doc["_id"]}, {"$set": fields}))
+        if updates:
+            await db.locations.bulk_write(updates)
+            await invalidate_locations_cache()
+            logger.info(f"Migrated {len(updates)} legacy location documents")
+    except Exception as e:
+        logger.error(f"Error migrating legacy locations: {e}")
+
+@app.on_event("startup")
+async def schedule_startup_tasks():
+    app.state.index_task = asyncio.create_task(ensure_indexes())
+    app.state.migration_task = asyncio.create_task(migrate_legacy_locations())
+
 # Routes
 @app.get("/")
 async def root():
@@ -92,60 +222,91 @@ async def api_root():
 @api_router.post("/admin/verify-pin")
 async def verify_admin_pin(data: AdminPinVerify):
     logger.info(f"Verifying PIN: {data.pin}")
-    settings = await db.admin_settings.find_one({"_id": "admin"})
-    logger.info(f"Admin settings found: {settings}")
-    if settings and settings.get("pin") == data.pin:
+    pin = await get_admin_pin()
+    if pin is not None and pin == data.pin:
         logger.info("PIN verified successfully")
         return {"success": True, "message": "PIN verified"}
     logger.warning(f"PIN verification failed for PIN: {data.pin}")
     raise HTTPException(status_code=401, detail="Invalid PIN")
 
 # Location endpoints
-@api_router.get("/locations", response_model=List[Location])
-async def get_locations():
-    locations = await db.locations.find({}, {"_id": 0}).to_list(1000)
-    for loc in locations:
-        if isinstance(loc.get('created_at'), str):
-            loc['created_at'] = datetime.fromisoformat(loc['created_at'])
-    return locations
+@api_router.get(
+    "/locations",
+    response_model=List[Location],
+    responses={200: {"content": {"application/x-ndjson": {}}, "description": "JSON list, or NDJSON of the requested fields when ?fields= is given"}}
+)
+async def get_locations(request: Request, fields: Optional[str] = None):
+    global _locations_cache
+    # Partial documents (?fields=id,name) are streamed as NDJSON straight from the cursor
+    if fields:
+        requested = {f.strip() for f in fields.split(',') if f.strip()}
+        unknown = requested - set(Location.model_fields)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+        projection = location_projection({"id"} | requested)
+        return StreamingResponse(stream_locations(projection), media_type="application/x-ndjson")
+    # Stored documents were validated on write, so the encoded body is cached and returned
+    # as-is instead of re-validating through response_model (which stays for the OpenAPI schema)
+    version = await get_locations_version()
+    if (_locations_cache is not None and _locations_cache[0] == version
+            and _locations_cache[1] > time.monotonic()):
+        _, _, body, etag = _locations_cache
+    else:
+        generation = _locations_cache_generation
+        locations = await db.locations.find({}, location_projection(Location.model_fields)).to_list(1000)
+        body = orjson.dumps(locations, option=orjson.OPT_UTC_Z)
+        etag = f'"{hashlib.md5(body, usedforsecurity=False).hexdigest()}"'
+        if generation == _locations_cache_generation:
+            _locations_cache = (version, time.monotonic() + LOCATIONS_CACHE_TTL, body, etag)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+async def stream_locations(projection: dict):
+    async for doc in db.locations.find({}, projection):
+        yield orjson.dumps(doc, option=orjson.OPT_APPEND_NEWLINE | orjson.OPT_UTC_Z)
 
 @api_router.get("/locations/{location_id}", response_model=Location)
 async def get_location(location_id: str):
     location = await db.locations.find_one({"id": location_id}, {"_id": 0})
     if not location:
         raise HTTPException(status_code=404, detail="Location not found")
-    if isinstance(location.get('created_at'), str):
-        location['created_at'] = datetime.fromisoformat(location['created_at'])
     return location
 
 @api_router.post("/locations", response_model=Location, status_code=201)
 async def create_location(location: LocationCreate):
-    location_dict = location.model_dump()
-    location_obj = Location(**location_dict)
-    
+    # Fields were validated as LocationCreate; construct without a second validation pass
+    location_obj = Location.model_construct(**dict(location))
     doc = location_obj.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
-    
     await db.locations.insert_one(doc)
+    await invalidate_locations_cache()
     return location_obj
 
 @api_router.put("/locations/{location_id}", response_model=Location)
 async def update_location(location_id: str, location_update: LocationUpdate):
-    existing = await db.locations.find_one({"id": location_id}, {"_id": 0})
-    if not existing:
-        raise HTTPException(status_code=404, detail="Location not found")
-    
     update_data = {k: v for k, v in location_update.model_dump().items() if v is not None}
     
     if update_data:
-        await db.locations.update_one(
+        updated = await db.locations.find_one_and_update(
             {"id": location_id},
-            {"$set": update_data}
+            {"$set": update_data},
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER
         )
+    else:
+        updated = await db.locations.find_one({"id": location_id}, {"_id": 0})
     
-    updated = await db.locations.find_one({"id": location_id}, {"_id": 0})
-    if isinstance(updated.get('created_at'), str):
-        updated['created_at'] = datetime.fromisoformat(updated['created_at'])
+    if not updated:
+        raise HTTPException(status_code=404, detail="Location not found")
+    if update_data:
+        await invalidate_locations_cache()
     return updated
 
 @api_router.delete("/locations/{location_id}")
@@ -153,39 +314,46 @@ async def delete_location(location_id: str):
     result = await db.locations.delete_one({"id": location_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Location not found")
+    await invalidate_locations_cache()
     return {"success": True, "message": "Location deleted"}
 
+@api_router.post("/locations/bulk-delete")
+async def bulk_delete_locations(data: LocationBulkDelete):
+    result = await db.locations.delete_many({"id": {"$in": data.ids}})
+    if result.deleted_count:
+        await invalidate_locations_cache()
+    return {"success": True, "deleted_count": result.deleted_count}
+
 # File upload endpoint
+def save_upload(src, file_path: Path):
+    with open(file_path, 'wb') as dst:
+        shutil.copyfileobj(src, dst, length=UPLOAD_CHUNK_SIZE)
+
 @api_router.post("/upload")
 async def upload_file(file: UploadFile = File(...)):
+    # Generate unique filename
+    file_extension = Path(file.filename or "").suffix
+    unique_filename = f"{uuid.uuid4()}{file_extension}"
+    file_path = UPLOADS_DIR / unique_filename
+    
+    # Copy the spooled upload to disk on a worker thread, in bounded chunks
     try:
-        # Generate unique filename
-        file_extension = Path(file.filename).suffix
-        unique_filename = f"{uuid.uuid4()}{file_extension}"
-        file_path = UPLOADS_DIR / unique_filename
-        
-        # Save file
-        async with aiofiles.open(file_path, 'wb') as f:
-            content = await file.read()
-            await f.write(content)
-        
-        # Return URL
-        file_url = f"/api/uploads/{unique_filename}"
-        return {"success": True, "url": file_url}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-# Serve uploaded files
-@api_router.get("/uploads/{filename}")
-async def get_uploaded_file(filename: str):
-    file_path = UPLOADS_DIR / filename
-    if not file_path.exists():
-        raise HTTPException(status_code=404, detail="File not found")
-    return FileResponse(file_path)
+        await asyncio.to_thread(save_upload, file.file, file_path)
+    except OSError as e:
+        logger.error(f"Error saving upload {unique_filename}: {e}")
+        file_path.unlink(missing_ok=True)
+        raise HTTPException(status_code=500, detail="Failed to save file")
+    
+    # Return URL
+    file_url = f"/api/uploads/{unique_filename}"
+    return {"success": True, "url": file_url}
 
 # Include the router in the main app
 app.include_router(api_router)
 
+# Serve uploaded files straight from disk
+app.mount("/api/uploads", StaticFiles(directory=str(UPLOADS_DIR)), name="uploads")
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -203,4 +371,4 @@ logger = logging.getLogger(__name__)
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
+    await client.close()
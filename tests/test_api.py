@@ -5,6 +5,7 @@ Tests: Locations CRUD, Admin PIN verification
 import pytest
 import requests
 import os
+import json
 import uuid
 
 # Get BASE_URL from environment (origin without /api). Prefer BACKEND_TEST_BASE_URL or REACT_APP_BACKEND_URL.
@@ -75,14 +76,19 @@ class TestLocationsCRUD:
         self.test_prefix = "TEST_"
         self.created_ids = []
         yield
-        # Cleanup: Delete all test-created locations (log if deletion fails)
-        for loc_id in self.created_ids:
-            try:
-                r = requests.delete(f"{API_BASE}/locations/{loc_id}", timeout=REQUEST_TIMEOUT)
-                if r.status_code != 200:
-                    print(f"Cleanup warning: deleting {loc_id} returned {r.status_code}: {r.text[:200]}")
-            except Exception as e:
-                print(f"Cleanup exception deleting {loc_id}: {e}")
+        # Cleanup: Delete all test-created locations in one request (log if deletion fails)
+        if not self.created_ids:
+            return
+        try:
+            r = requests.post(
+                f"{API_BASE}/locations/bulk-delete",
+                json={"ids": self.created_ids},
+                timeout=REQUEST_TIMEOUT
+            )
+            if r.status_code != 200:
+                print(f"Cleanup warning: bulk delete of {self.created_ids} returned {r.status_code}: {r.text[:200]}")
+        except Exception as e:
+            print(f"Cleanup exception bulk deleting {self.created_ids}: {e}")
     
     def test_get_locations_list(self):
         """Test GET /api/locations returns list"""
@@ -91,6 +97,68 @@ class TestLocationsCRUD:
         data = response.json()
         assert isinstance(data, list)
     
+    def test_get_locations_matches_single_location(self):
+        """Test GET /api/locations encodes a location the same way as GET /api/locations/{id}"""
+        create_response = requests.post(
+            f"{API_BASE}/locations",
+            json={
+                "name": f"{self.test_prefix}Encoding_{uuid.uuid4().hex[:6]}",
+                "coordinates": {"x": 1.5, "y": 0, "z": 2.5}
+            },
+            timeout=REQUEST_TIMEOUT
+        )
+        assert create_response.status_code == 201
+        location_id = create_response.json()["id"]
+        self.created_ids.append(location_id)
+        
+        single = requests.get(f"{API_BASE}/locations/{location_id}", timeout=REQUEST_TIMEOUT).json()
+        listed = requests.get(f"{API_BASE}/locations", timeout=REQUEST_TIMEOUT).json()
+        match = [loc for loc in listed if loc["id"] == location_id]
+        assert match == [single]
+    
+    def test_get_locations_not_modified(self):
+        """Test GET /api/locations returns 304 when If-None-Match matches the ETag"""
+        response = requests.get(f"{API_BASE}/locations", timeout=REQUEST_TIMEOUT)
+        assert response.status_code == 200
+        etag = response.headers.get("ETag")
+        assert etag
+        
+        cached_response = requests.get(
+            f"{API_BASE}/locations",
+            headers={"If-None-Match": etag},
+            timeout=REQUEST_TIMEOUT
+        )
+        assert cached_response.status_code == 304
+        assert cached_response.content == b""
+    
+    def test_get_locations_projected_fields(self):
+        """Test GET /api/locations?fields=... streams only the requested fields as NDJSON"""
+        unique_name = f"{self.test_prefix}Projection_{uuid.uuid4().hex[:6]}"
+        create_response = requests.post(
+            f"{API_BASE}/locations",
+            json={
+                "name": unique_name,
+                "description": "Should not be returned",
+                "coordinates": {"x": 0, "y": 0, "z": 0}
+            },
+            timeout=REQUEST_TIMEOUT
+        )
+        assert create_response.status_code == 201
+        location_id = create_response.json()["id"]
+        self.created_ids.append(location_id)
+        
+        response = requests.get(f"{API_BASE}/locations", params={"fields": "name"}, timeout=REQUEST_TIMEOUT)
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        rows = [json.loads(line) for line in response.text.splitlines() if line]
+        match = [row for row in rows if row["id"] == location_id]
+        assert match == [{"id": location_id, "name": unique_name}]
+    
+    def test_get_locations_unknown_field(self):
+        """Test GET /api/locations?fields=... rejects unknown field names"""
+        response = requests.get(f"{API_BASE}/locations", params={"fields": "id,password"}, timeout=REQUEST_TIMEOUT)
+        assert response.status_code == 400
+    
     def test_create_location(self):
         """Test POST /api/locations creates new location"""
         unique_name = f"{self.test_prefix}Radiology_{uuid.uuid4().hex[:6]}"
@@ -281,6 +349,37 @@ class TestLocationsCRUD:
         get_response = requests.get(f"{API_BASE}/locations/{location_id}", timeout=REQUEST_TIMEOUT)
         assert get_response.status_code == 404
     
+    def test_bulk_delete_locations(self):
+        """Test POST /api/locations/bulk-delete removes all given locations"""
+        location_ids = []
+        for i in range(3):
+            create_response = requests.post(
+                f"{API_BASE}/locations",
+                json={
+                    "name": f"{self.test_prefix}Bulk{i}_{uuid.uuid4().hex[:6]}",
+                    "coordinates": {"x": i, "y": 0, "z": 0}
+                },
+                timeout=REQUEST_TIMEOUT
+            )
+            assert create_response.status_code == 201
+            location_ids.append(create_response.json()["id"])
+            self.created_ids.append(location_ids[-1])
+        
+        # Unknown ids are ignored
+        response = requests.post(
+            f"{API_BASE}/locations/bulk-delete",
+            json={"ids": location_ids + [str(uuid.uuid4())]},
+            timeout=REQUEST_TIMEOUT
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert data["success"] == True
+        assert data["deleted_count"] == 3
+        
+        for location_id in location_ids:
+            get_response = requests.get(f"{API_BASE}/locations/{location_id}", timeout=REQUEST_TIMEOUT)
+            assert get_response.status_code == 404
+    
     def test_delete_nonexistent_location(self):
         """Test DELETE /api/locations/{id} returns 404 for non-existent"""
         fake_id = str(uuid.uuid4())
@@ -312,3 +411,15 @@ class TestLocationValidation:
             timeout=REQUEST_TIMEOUT
         )
         assert response.status_code == 422  # Validation error
+    
+    def test_create_location_incomplete_coordinates(self):
+        """Test creating location with coordinates missing an axis fails"""
+        response = requests.post(
+            f"{API_BASE}/locations",
+            json={
+                "name": "Test Location",
+                "coordinates": {"x": 0, "y": 0}
+            },
+            timeout=REQUEST_TIMEOUT
+        )
+        assert response.status_code == 422  # Validation error